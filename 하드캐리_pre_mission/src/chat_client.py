@@ -1,8 +1,12 @@
 import os
 import time
+import asyncio
+import signal
 import logging
+import threading
+import httpx
 from dotenv import load_dotenv
-from openai import OpenAI
+from openai import AsyncOpenAI
 from tenacity import retry, stop_after_attempt, wait_fixed
 
 # 0. 환경 변수 로드 (.env 파일의 내용을 읽어옴)
@@ -22,63 +26,176 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+# 2. 토큰 카운터 (tiktoken이 없으면 UTF-8 바이트 수 기반 근사치 사용)
+try:
+    import tiktoken
+    _encoding = tiktoken.get_encoding("cl100k_base")
+except Exception:
+    _encoding = None
+
+def count_tokens(message):
+    """메시지 하나의 토큰 수 (역할/구분자 오버헤드 4토큰 포함)"""
+    content = message["content"] or ""
+    if _encoding is not None:
+        return len(_encoding.encode(content)) + 4
+    # 한글은 글자당 약 1토큰(3바이트), 영어는 약 4바이트당 1토큰
+    return len(content.encode("utf-8")) // 3 + 4
+
+async def ainput(prompt):
+    """이벤트 루프를 막지 않는 input() (데몬 스레드라 Ctrl+C 종료 시에도 대기하지 않음)"""
+    loop = asyncio.get_running_loop()
+    future = loop.create_future()
+
+    def resolve(setter, value):
+        if not future.done():
+            setter(value)
+
+    def reader():
+        try:
+            line = input(prompt)
+        except BaseException as e:
+            loop.call_soon_threadsafe(resolve, future.set_exception, e)
+        else:
+            loop.call_soon_threadsafe(resolve, future.set_result, line)
+
+    threading.Thread(target=reader, daemon=True).start()
+    return await future
+
+def install_sigint_handler(loop, callback):
+    """Ctrl+C를 callback으로 연결하고, 이전 핸들러로 되돌리는 함수를 반환"""
+    previous = signal.getsignal(signal.SIGINT)
+    try:
+        loop.add_signal_handler(signal.SIGINT, callback)
+    except NotImplementedError:
+        # Windows 이벤트 루프는 add_signal_handler를 지원하지 않음
+        signal.signal(signal.SIGINT, lambda *_: loop.call_soon_threadsafe(callback))
+        return lambda: signal.signal(signal.SIGINT, previous)
+
+    def restore():
+        loop.remove_signal_handler(signal.SIGINT)
+        signal.signal(signal.SIGINT, previous)
+    return restore
+
 class MiniMaxChatClient:
     def __init__(self):
         load_dotenv()
         api_key = os.getenv("MINIMAX_API_KEY")
         
         # 1. URL을 'minimaxi'로 유지
-        self.client = OpenAI(
+        # 연결 타임아웃(3초)은 전체 타임아웃(10초)과 분리하여 빠르게 재시도
+        self.client = AsyncOpenAI(
             api_key=api_key,
             base_url="https://api.minimaxi.chat/v1",
+            timeout=httpx.Timeout(10.0, connect=3.0),
         )
         
         self.history = [
             {"role": "system", "content": "너는 현관 거울 속의 루틴 관리자야. 짧고 명확하게 대답해."}
         ]
-        self.max_history = 10 
+        self.max_history_tokens = 2000
 
-    @retry(stop=stop_after_attempt(3), wait=wait_fixed(2))
-    def get_response(self, user_input):
+    async def get_response(self, user_input):
+        # 질문은 재시도 범위 밖에서 한 번만 기록 (재시도 시 같은 질문이 중복 전송되지 않도록)
         self.history.append({"role": "user", "content": user_input})
         
-        if len(self.history) > (self.max_history * 2 + 1):
-            self.history = [self.history[0]] + self.history[-(self.max_history * 2):]
+        # 토큰 예산을 넘으면 시스템 메시지와 최신 질문은 남기고 오래된 메시지부터 제거
+        total_tokens = sum(count_tokens(m) for m in self.history)
+        while total_tokens > self.max_history_tokens and len(self.history) > 2:
+            total_tokens -= count_tokens(self.history.pop(1))
+
+        return await self._stream_response(user_input)
 
+    # async 함수에는 tenacity가 asyncio.sleep으로 대기하므로 재시도 중에도 이벤트 루프가 멈추지 않음
+    # 토큰이 한 번이라도 출력된 뒤의 오류는 재시도하지 않고 받은 부분까지만 기록
+    @retry(stop=stop_after_attempt(3), wait=wait_fixed(2))
+    async def _stream_response(self, user_input):
         # start_time 변수를 try 블록 밖으로 꺼냈습니다.
         start_time = time.time() 
         try:
-            response = self.client.chat.completions.create(
+            # 스트리밍 응답: 토큰이 도착하는 대로 출력하여 체감 지연(TTFT) 단축
+            stream = await self.client.chat.completions.create(
                 model="minimax-text-01", # 성공한 모델명으로 고정
                 messages=self.history,
-                timeout=10.0 
+                stream=True,
+                stream_options={"include_usage": True},
             )
+
+            answer_parts = []
+            usage = None
+            ttft = None
+
+            async def consume_stream():
+                nonlocal usage, ttft
+                async for chunk in stream:
+                    # 사용량 통계는 마지막 청크에 포함됨
+                    if chunk.usage is not None:
+                        usage = chunk.usage
+                    if not chunk.choices:
+                        continue
+
+                    delta = chunk.choices[0].delta.content or ""
+                    if delta:
+                        if ttft is None:
+                            ttft = (time.time() - start_time) * 1000
+                            # 첫 토큰이 도착했을 때 머리말 출력 (재시도 시 머리말이 중복되지 않도록)
+                            print("\n[AI]: ", end="", flush=True) # 터미널에도 대답이 보이게 추가
+                        print(delta, end="", flush=True)
+                        answer_parts.append(delta)
+
+            stream_task = asyncio.create_task(consume_stream())
+
+            # 스트리밍 중에만 Ctrl+C를 스트림 작업 취소로 연결 (받은 부분까지만 기록)
+            restore_sigint = install_sigint_handler(asyncio.get_running_loop(), stream_task.cancel)
+            try:
+                await asyncio.wait({stream_task})
+            finally:
+                restore_sigint()
+                if not stream_task.done():
+                    stream_task.cancel()
+
+            if ttft is None and (stream_task.cancelled() or stream_task.exception() is None):
+                # 내용 없이 끝나거나 중단된 응답도 머리말은 출력
+                print("\n[AI]: ", end="")
+
+            if stream_task.cancelled():
+                await stream.close()
+                print(" (중단됨)", end="")
+                logger.info("사용자가 응답 스트리밍을 중단했습니다.")
+            elif stream_task.exception() is not None:
+                if not answer_parts:
+                    # 아직 출력된 내용이 없으면 그대로 전달하여 재시도 대상이 되도록 함
+                    raise stream_task.exception()
+                # 이미 출력된 내용은 되돌릴 수 없으므로 재시도하지 않고 받은 부분까지만 기록
+                print(" (오류로 중단됨)", end="")
+                logger.error(f"응답 스트리밍 중 오류 발생: {stream_task.exception()}")
+            print()
             latency = (time.time() - start_time) * 1000
 
-            answer = response.choices[0].message.content
-            usage = response.usage
+            answer = "".join(answer_parts)
             
             logger.info(f"User: {user_input}")
             logger.info(f"AI: {answer}")
-            logger.info(f"Usage: Prompt {usage.prompt_tokens}, Completion {usage.completion_tokens}, Total {usage.total_tokens}")
+            if usage is not None:
+                logger.info(f"Usage: Prompt {usage.prompt_tokens}, Completion {usage.completion_tokens}, Total {usage.total_tokens}")
+            if ttft is not None:
+                logger.info(f"TTFT: {ttft:.2f}ms")
             logger.info(f"Latency: {latency:.2f}ms")
             
             self.history.append({"role": "assistant", "content": answer})
-            print(f"\n[AI]: {answer}") # 터미널에도 대답이 보이게 추가
             return answer
 
         except Exception as e:
             logger.error(f"API 호출 중 오류 발생: {e}")
             raise e
 
-def main():
+async def main():
     try:
         chat_client = MiniMaxChatClient()
         print("\n=== Routine Tracker Mirror Chat (M1) ===")
         print("대화를 시작합니다. (종료: exit / quit)\n")
 
         while True:
-            user_input = input("[나]: ")
+            user_input = await ainput("[나]: ")
             if user_input.lower() in ['exit', 'quit']:
                 print("프로그램을 종료합니다.")
                 break
@@ -86,10 +203,10 @@ def main():
             if not user_input.strip():
                 continue
 
-            chat_client.get_response(user_input)
+            await chat_client.get_response(user_input)
             
     except Exception as e:
         print(f"초기화 실패: {e}")
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    asyncio.run(main())
\ No newline at end of file
@@ -3,9 +3,32 @@ import mediapipe as mp
 import time
 import numpy as np
 import os
+import math
+import queue
+import threading
+import traceback
+from functools import lru_cache
+
+# Numba가 설치되어 있으면 JIT 블렌딩 커널 사용, 없으면 NumPy 경로로 동작
+try:
+    from numba import njit, prange
+except ImportError:
+    njit = None
+
+# 변환 캐시에서 사용하는 선글라스 스프라이트 (rgb, alpha)
+_sunglasses_sprite = None
+
+# 렌더링에 사용하는 랜드마크 인덱스 (왼쪽 홍채 중심 468, 오른쪽 홍채 중심 473, 코끝 1)
+KEYPOINT_IDX = (468, 473, 1)
+
+# 랜드마크 감지에 사용할 최대 입력 너비 (렌더링은 원본 해상도 유지)
+INFERENCE_MAX_WIDTH = 640
+
+# 감지 단계의 프레임당 시간 예산 (30 FPS 기준, 초과하면 격 프레임마다 감지 생략)
+INFERENCE_BUDGET_MS = 1000 / 30
 
 def load_sunglasses_with_alpha(image_path):
-    """선글라스 이미지를 로드하고 흰색 배경을 제거하여 알파 채널 생성"""
+    """선글라스 이미지를 로드하고 흰색 배경을 제거하여 (rgb, alpha) 평면으로 분리"""
     # 한글 경로 지원을 위해 numpy로 읽기
     with open(image_path, "rb") as f:
         file_bytes = np.frombuffer(f.read(), dtype=np.uint8)
@@ -15,31 +38,42 @@ def load_sunglasses_with_alpha(image_path):
         print(f"Error: Could not load sunglasses image from {image_path}")
         return None
     
-    # 알파 채널이 없으면 흰색 배경 제거
-    if img.shape[2] == 3:
-        # BGR to BGRA
-        img = cv2.cvtColor(img, cv2.COLOR_BGR2BGRA)
-        
-        # 흰색/밝은 배경 제거 (임계값 기반)
-        # 밝기가 높은 픽셀(흰색)을 투명하게
-        gray = cv2.cvtColor(img[:, :, :3], cv2.COLOR_BGR2GRAY)
-        
-        # 흰색 배경 감지 (밝기 > 240)
-        white_mask = gray > 240
-        
-        # 알파 채널 설정: 흰색 배경은 투명(0), 나머지는 불투명(255)
-        img[:, :, 3] = np.where(white_mask, 0, 255).astype(np.uint8)
-    else:
-        # 이미 알파 채널이 있어도 흰색 배경 제거
-        gray = cv2.cvtColor(img[:, :, :3], cv2.COLOR_BGR2GRAY)
-        white_mask = gray > 240
-        img[:, :, 3] = np.where(white_mask, 0, img[:, :, 3]).astype(np.uint8)
+    # 색상 평면은 연속 메모리로 분리 (매 프레임 채널 슬라이싱 방지)
+    rgb = np.ascontiguousarray(img[:, :, :3])
+    
+    # 흰색/밝은 배경 제거 (임계값 기반)
+    # 밝기가 높은 픽셀(흰색)을 투명하게
+    gray = cv2.cvtColor(rgb, cv2.COLOR_BGR2GRAY)
+    
+    # 알파 채널 설정: 흰색 배경(밝기 > 240)은 투명(0), 나머지는 불투명(255)
+    _, alpha = cv2.threshold(gray, 240, 255, cv2.THRESH_BINARY_INV)
     
-    return img
+    # 이미 알파 채널이 있으면 기존 알파와 결합
+    if img.shape[2] == 4:
+        alpha = cv2.bitwise_and(np.ascontiguousarray(img[:, :, 3]), alpha)
+    
+    return rgb, alpha
+
+if njit is not None:
+    # 명시적 시그니처(A 레이아웃)로 import 시점에 한 번만 컴파일
+    # 연속(C)/슬라이스(A) 배열 모두 이 시그니처로 처리되어 첫 프레임에서 재컴파일되지 않음
+    @njit("void(u1[:, :, :], u1[:, :, :], u1[:, :])", parallel=True, cache=True)
+    def _blend_kernel(roi, fg_rgb, fg_alpha):
+        """행 단위 병렬 정수 알파 블렌딩 (roi에 직접 기록)"""
+        h, w = fg_alpha.shape
+        for i in prange(h):
+            for j in range(w):
+                a = np.int32(fg_alpha[i, j])
+                inv = 255 - a
+                for c in range(3):
+                    v = np.int32(fg_rgb[i, j, c]) * a + np.int32(roi[i, j, c]) * inv
+                    roi[i, j, c] = (v + (v >> 8) + 128) >> 8
+else:
+    _blend_kernel = None
 
-def overlay_image_alpha(background, overlay, x, y):
-    """알파 채널을 이용한 이미지 오버레이"""
-    h, w = overlay.shape[:2]
+def overlay_image_alpha(background, overlay_rgb, overlay_alpha, x, y, work=None):
+    """알파 채널을 이용한 이미지 오버레이 (RGB/알파 평면 분리 입력, work: 재사용할 uint16 작업 버퍼 쌍)"""
+    h, w = overlay_alpha.shape[:2]
     bg_h, bg_w = background.shape[:2]
     
     # 경계 체크
@@ -60,22 +94,68 @@ def overlay_image_alpha(background, overlay, x, y):
     overlay_x2 = overlay_x1 + (x2 - x1)
     overlay_y2 = overlay_y1 + (y2 - y1)
     
-    # 알파 블렌딩
-    alpha = overlay[overlay_y1:overlay_y2, overlay_x1:overlay_x2, 3] / 255.0
-    alpha = alpha[:, :, np.newaxis]
-    
     roi = background[y1:y2, x1:x2]
-    overlay_rgb = overlay[overlay_y1:overlay_y2, overlay_x1:overlay_x2, :3]
+    overlay_rgb = overlay_rgb[overlay_y1:overlay_y2, overlay_x1:overlay_x2]
+    alpha = overlay_alpha[overlay_y1:overlay_y2, overlay_x1:overlay_x2, np.newaxis]
+    
+    # 완전 투명/완전 불투명 영역은 블렌딩 생략 (축소 샘플로 먼저 확인)
+    if not np.any(alpha[::4, ::4]) and not np.any(alpha):
+        return background
+    if np.all(alpha[::4, ::4] == 255) and np.all(alpha == 255):
+        roi[...] = overlay_rgb
+        return background
+    
+    if _blend_kernel is not None:
+        _blend_kernel(roi, overlay_rgb, alpha[:, :, 0])
+        return background
+    
+    # 정수 알파 블렌딩 (uint16): result = (overlay * a + background * (255 - a)) / 255
+    a = alpha.astype(np.uint16)
+    if work is None:
+        blended = overlay_rgb.astype(np.uint16)
+        tmp = roi.astype(np.uint16)
+    else:
+        roi_h, roi_w = roi.shape[:2]
+        blended = work[0][:roi_h, :roi_w]
+        tmp = work[1][:roi_h, :roi_w]
+        np.copyto(blended, overlay_rgb)
+        np.copyto(tmp, roi)
+    np.multiply(blended, a, out=blended)
+    np.multiply(tmp, 255 - a, out=tmp)
+    np.add(blended, tmp, out=blended)
+    
+    # 255로 나누기 근사: (x + (x >> 8) + 128) >> 8
+    np.right_shift(blended, 8, out=tmp)
+    np.add(blended, tmp, out=blended)
+    np.add(blended, 128, out=blended)
+    np.right_shift(blended, 8, out=blended)
+    np.copyto(roi, blended, casting="unsafe")
     
-    # 블렌딩 공식: result = overlay * alpha + background * (1 - alpha)
-    blended = (overlay_rgb * alpha + roi * (1 - alpha)).astype(np.uint8)
-    background[y1:y2, x1:x2] = blended
+    return background
+
+def blend_many(background, overlays):
+    """여러 얼굴의 선글라스 (rgb, alpha, x, y)를 한 번에 합성"""
+    if not overlays:
+        return background
+    
+    # 출력 행 순서대로 기록하도록 y 기준 정렬
+    overlays = sorted(overlays, key=lambda o: o[3])
+    
+    # NumPy 경로는 가장 큰 오버레이 크기로 작업 버퍼를 한 번만 할당하여 공유
+    work = None
+    if _blend_kernel is None:
+        max_h = max(o[1].shape[0] for o in overlays)
+        max_w = max(o[1].shape[1] for o in overlays)
+        work = (np.empty((max_h, max_w, 3), np.uint16), np.empty((max_h, max_w, 3), np.uint16))
+    
+    for overlay_rgb, overlay_alpha, x, y in overlays:
+        overlay_image_alpha(background, overlay_rgb, overlay_alpha, x, y, work)
     
     return background
 
-def rotate_and_scale_image(img, angle, scale):
-    """이미지 회전 및 크기 조절"""
-    h, w = img.shape[:2]
+def rotate_and_scale_image(rgb, alpha, angle, scale):
+    """이미지 회전 및 크기 조절 (RGB/알파 평면을 각각 변환하여 튜플로 반환)"""
+    h, w = alpha.shape[:2]
     center = (w // 2, h // 2)
     
     # 회전 행렬
@@ -84,25 +164,234 @@ def rotate_and_scale_image(img, angle, scale):
     # 회전 후 이미지 크기 계산
     cos = np.abs(M[0, 0])
     sin = np.abs(M[0, 1])
-    new_w = int(h * sin + w * cos)
-    new_h = int(h * cos + w * sin)
+    new_w = max(1, int(np.ceil(h * sin + w * cos)))
+    new_h = max(1, int(np.ceil(h * cos + w * sin)))
     
     # 회전 중심 조정
     M[0, 2] += (new_w - w) / 2
     M[1, 2] += (new_h - h) / 2
     
-    # 회전 적용
-    rotated = cv2.warpAffine(img, M, (new_w, new_h), flags=cv2.INTER_LINEAR, borderMode=cv2.BORDER_CONSTANT, borderValue=(0, 0, 0, 0))
+    # 회전 적용: 색상은 선형 보간, 알파는 이진 마스크라 최근접 보간으로 충분
+    rotated_rgb = cv2.warpAffine(rgb, M, (new_w, new_h), flags=cv2.INTER_LINEAR, borderMode=cv2.BORDER_CONSTANT, borderValue=(0, 0, 0))
+    rotated_alpha = cv2.warpAffine(alpha, M, (new_w, new_h), flags=cv2.INTER_NEAREST, borderMode=cv2.BORDER_CONSTANT, borderValue=0)
     
-    return rotated
+    return rotated_rgb, rotated_alpha
 
-def main():
+def _target_bbox(center_x, center_y, sprite_w, sprite_h, scale, angle, frame_w, frame_h):
+    """회전/크기 변환 후 선글라스가 그려질 화면 영역 추정 (화면과 겹치지 않으면 None)"""
+    rad = math.radians(angle)
+    cos = abs(math.cos(rad)) * scale
+    sin = abs(math.sin(rad)) * scale
+    
+    # rotate_and_scale_image와 같은 방식으로 회전된 외곽 크기 계산
+    new_w = sprite_h * sin + sprite_w * cos
+    new_h = sprite_h * cos + sprite_w * sin
+    
+    x1 = max(0, int(center_x - new_w / 2))
+    y1 = max(0, int(center_y - new_h / 2))
+    x2 = min(frame_w, int(math.ceil(center_x + new_w / 2)))
+    y2 = min(frame_h, int(math.ceil(center_y + new_h / 2)))
+    if x1 >= x2 or y1 >= y2:
+        return None
+    return x1, y1, x2, y2
+
+def set_sunglasses_sprite(rgb, alpha):
+    """변환 캐시에 사용할 선글라스 스프라이트 등록 (교체 시 캐시 무효화)"""
+    global _sunglasses_sprite
+    _sunglasses_sprite = (rgb, alpha)
+    _warp_cached.cache_clear()
+
+@lru_cache(maxsize=64)
+def _warp_cached(angle_q, scale_q):
+    """양자화된 (각도, 배율) 키로 회전/크기 변환 결과를 캐시"""
+    rgb, alpha = _sunglasses_sprite
+    return rotate_and_scale_image(rgb, alpha, angle_q, math.exp(scale_q / 50))
+
+def get_transformed_sunglasses(angle, scale):
+    """등록된 선글라스를 회전/크기 변환 (각도 1도, 배율 약 2% 단위로 양자화)"""
+    # 배율은 로그 스케일로 양자화하여 작은 배율에서도 상대 오차를 일정하게 유지
+    angle_q = int(round(angle))
+    scale_q = int(round(math.log(max(scale, 1e-3)) * 50))
+    return _warp_cached(angle_q, scale_q)
+
+def put_latest(q, item):
+    """큐가 가득 차면 가장 오래된 항목을 버리고 새 항목을 넣음 (버린 개수 반환)"""
+    dropped = 0
+    while True:
+        try:
+            q.put_nowait(item)
+            return dropped
+        except queue.Full:
+            try:
+                q.get_nowait()
+                dropped += 1
+            except queue.Empty:
+                pass
+
+def drain_to_latest(q, latest):
+    """큐에 쌓인 항목을 모두 꺼내 가장 최신 항목만 반환 (밀린 프레임 버림)"""
+    dropped = 0
+    while True:
+        try:
+            latest = q.get_nowait()
+            dropped += 1
+        except queue.Empty:
+            return latest, dropped
+
+def capture_worker(cap, frame_queue, stop_event, stats):
+    """캡처 스레드: 웹캠 프레임을 읽어 좌우 반전 후 큐에 전달"""
+    try:
+        while not stop_event.is_set() and cap.isOpened():
+            success, image = cap.read()
+            if not success:
+                print("Ignoring empty camera frame.")
+                continue
+
+            # Flip the image horizontally for selfie-view
+            image = cv2.flip(image, 1)
+            stats["capture_drops"] += put_latest(frame_queue, (image, time.time()))
+    except Exception:
+        # 단계가 실패하면 오류를 출력하고 파이프라인 전체를 종료 (렌더 루프가 무한 대기하지 않도록)
+        traceback.print_exc()
+    finally:
+        stop_event.set()
+
+def landmarks_to_array(face_landmarks_list):
+    """얼굴별 주요 랜드마크를 (얼굴 수, KEYPOINT_IDX 수, xyz) 정규화 좌표 배열로 변환"""
+    return np.array(
+        [[(face[i].x, face[i].y, face[i].z) for i in KEYPOINT_IDX] for face in face_landmarks_list],
+        dtype=np.float32,
+    ).reshape(-1, len(KEYPOINT_IDX), 3)
+
+def extrapolate_faces(older, newer, t):
+    """직전 두 감지 결과 (시각, 좌표)로 시각 t의 얼굴 좌표를 선형 외삽"""
+    t1, faces1 = newer
+    if older is None:
+        return faces1
+    t0, faces0 = older
+    
+    # 얼굴 수가 바뀌었으면 대응 관계를 알 수 없으므로 최근 결과 재사용
+    if faces0.shape != faces1.shape or t1 <= t0 or len(faces1) == 0:
+        return faces1
+    
+    # 감지마다 얼굴 순서가 바뀔 수 있으므로 눈 중심이 가장 가까운 얼굴끼리 짝지음
+    centers0 = faces0[:, :2, :2].mean(axis=1)
+    centers1 = faces1[:, :2, :2].mean(axis=1)
+    dist = np.linalg.norm(centers1[:, np.newaxis] - centers0[np.newaxis], axis=2)
+    order = dist.argmin(axis=1)
+    if len(set(order.tolist())) != len(order):
+        return faces1
+    
+    # 두 감지 사이 이동량이 눈 사이 거리보다 크면 잘못 짝지은 것으로 보고 외삽하지 않음
+    eye_distance = np.linalg.norm(faces1[:, 1, :2] - faces1[:, 0, :2], axis=1)
+    if np.any(dist[np.arange(len(order)), order] > eye_distance):
+        return faces1
+    
+    faces0 = faces0[order]
+    k = min((t - t1) / (t1 - t0), 1.0)
+    return faces1 + (faces1 - faces0) * k
+
+def inference_worker(landmarker, frame_queue, result_queue, stop_event, stats):
+    """추론 스레드: 최신 프레임에 대해 얼굴 랜드마크 감지"""
+    try:
+        last_timestamp_ms = -1
+        # 감지 입력용 버퍼는 프레임마다 새로 할당하지 않고 재사용
+        # (detect_for_video는 동기 호출이라 다음 프레임에서 덮어써도 안전)
+        resize_buffer = None
+        rgb_buffer = None
+    
+        # 격 프레임 감지 생략용 상태: 최근 두 감지 결과와 감지 시간 이동평균(EMA)
+        prev_faces = None
+        prev_prev_faces = None
+        detect_ema_ms = None
+        frame_index = 0
+        while not stop_event.is_set():
+            try:
+                item = frame_queue.get(timeout=0.1)
+            except queue.Empty:
+                continue
+            (image, current_time), dropped = drain_to_latest(frame_queue, item)
+            stats["inference_drops"] += dropped
+            frame_index += 1
+
+            # 감지가 예산보다 느리면 짝수 프레임은 감지 없이 이전 결과를 외삽하여 렌더링
+            if (frame_index % 2 == 0 and prev_faces is not None
+                    and detect_ema_ms is not None and detect_ema_ms > INFERENCE_BUDGET_MS):
+                faces = extrapolate_faces(prev_prev_faces, prev_faces, current_time)
+                stats["skipped_detections"] += 1
+                put_latest(result_queue, (image, faces, current_time))
+                continue
+
+            detect_start = time.perf_counter()
+
+            # 감지용 입력 축소 (랜드마크는 정규화 좌표라 원본 크기에 그대로 적용 가능)
+            # BGR 상태에서 먼저 줄여 색 변환도 작은 프레임에서만 수행
+            inference_bgr = image
+            h, w = image.shape[:2]
+            if w > INFERENCE_MAX_WIDTH:
+                small_h = max(1, round(h * INFERENCE_MAX_WIDTH / w))
+                if resize_buffer is None or resize_buffer.shape[:2] != (small_h, INFERENCE_MAX_WIDTH):
+                    resize_buffer = np.empty((small_h, INFERENCE_MAX_WIDTH, 3), dtype=np.uint8)
+                cv2.resize(image, (INFERENCE_MAX_WIDTH, small_h), dst=resize_buffer, interpolation=cv2.INTER_AREA)
+                inference_bgr = resize_buffer
+
+            # 감지용 RGB 변환 (원본 BGR 프레임은 렌더링에 그대로 사용)
+            if rgb_buffer is None or rgb_buffer.shape != inference_bgr.shape:
+                rgb_buffer = np.empty_like(inference_bgr)
+            cv2.cvtColor(inference_bgr, cv2.COLOR_BGR2RGB, dst=rgb_buffer)
+
+            # VIDEO 모드는 타임스탬프가 단조 증가해야 함
+            frame_timestamp_ms = max(int(current_time * 1000), last_timestamp_ms + 1)
+            last_timestamp_ms = frame_timestamp_ms
+
+            # MediaPipe Tasks 형식으로 이미지 변환
+            mp_image = mp.Image(image_format=mp.ImageFormat.SRGB, data=rgb_buffer)
+        
+            # 얼굴 랜드마크 감지
+            result = landmarker.detect_for_video(mp_image, frame_timestamp_ms)
+            faces = landmarks_to_array(result.face_landmarks)
+
+            detect_ms = (time.perf_counter() - detect_start) * 1000
+            detect_ema_ms = detect_ms if detect_ema_ms is None else 0.9 * detect_ema_ms + 0.1 * detect_ms
+
+            prev_prev_faces, prev_faces = prev_faces, (current_time, faces)
+            put_latest(result_queue, (image, faces, current_time))
+    except Exception:
+        traceback.print_exc()
+    finally:
+        stop_event.set()
+
+def create_face_landmarker(model_data):
+    """GPU 델리게이트로 FaceLandmarker 생성, 실패하면 기본(CPU/XNNPACK) 델리게이트로 대체"""
     # MediaPipe Tasks API 사용
     BaseOptions = mp.tasks.BaseOptions
     FaceLandmarker = mp.tasks.vision.FaceLandmarker
     FaceLandmarkerOptions = mp.tasks.vision.FaceLandmarkerOptions
     RunningMode = mp.tasks.vision.RunningMode
 
+    def build_options(base_options):
+        return FaceLandmarkerOptions(
+            base_options=base_options,
+            running_mode=RunningMode.VIDEO,
+            num_faces=5,  
+            min_face_detection_confidence=0.5,
+            min_face_presence_confidence=0.5,
+            min_tracking_confidence=0.5,
+        )
+
+    try:
+        gpu_base = BaseOptions(model_asset_buffer=model_data, delegate=BaseOptions.Delegate.GPU)
+        landmarker = FaceLandmarker.create_from_options(build_options(gpu_base))
+        print("FaceLandmarker delegate: GPU")
+        return landmarker
+    except (RuntimeError, NotImplementedError) as e:
+        print(f"GPU delegate unavailable ({type(e).__name__}), falling back to CPU.")
+
+    landmarker = FaceLandmarker.create_from_options(build_options(BaseOptions(model_asset_buffer=model_data)))
+    print("FaceLandmarker delegate: CPU")
+    return landmarker
+
+def main():
     # 모델 파일을 바이트로 읽기 (한글 경로 문제 해결)
     script_dir = os.path.dirname(os.path.abspath(__file__))
     model_path = os.path.join(script_dir, "face_landmarker.task")
@@ -112,19 +401,12 @@ def main():
 
     # 선글라스 이미지 로드
     sunglasses_path = os.path.join(script_dir, "sunglasses.png")
-    sunglasses_img = load_sunglasses_with_alpha(sunglasses_path)
-    if sunglasses_img is None:
+    sunglasses = load_sunglasses_with_alpha(sunglasses_path)
+    if sunglasses is None:
         print("Error: Failed to load sunglasses image.")
         return
-
-    options = FaceLandmarkerOptions(
-        base_options=BaseOptions(model_asset_buffer=model_data),
-        running_mode=RunningMode.VIDEO,
-        num_faces=5,  
-        min_face_detection_confidence=0.5,
-        min_face_presence_confidence=0.5,
-        min_tracking_confidence=0.5,
-    )
+    sunglasses_rgb, sunglasses_alpha = sunglasses
+    set_sunglasses_sprite(sunglasses_rgb, sunglasses_alpha)
 
     # Open webcam
     cap = cv2.VideoCapture(0)
@@ -132,96 +414,106 @@ def main():
         print("Error: Could not open webcam.")
         return
 
-    # For FPS calculation
-    prev_time = 0
-    
     # For printing control
     last_print_time = 0
 
-    print("Press 'q' to exit.")
-
-    with FaceLandmarker.create_from_options(options) as landmarker:
-        while cap.isOpened():
-            success, image = cap.read()
-            if not success:
-                print("Ignoring empty camera frame.")
-                continue
+    # 캡처 → 추론 → 렌더링 파이프라인 (단계 사이는 최신 프레임만 유지하는 큐)
+    frame_queue = queue.Queue(maxsize=2)
+    result_queue = queue.Queue(maxsize=2)
+    stop_event = threading.Event()
+    stats = {"capture_drops": 0, "inference_drops": 0, "render_drops": 0, "skipped_detections": 0}
+    rendered_frames = 0
 
-            # Flip the image horizontally for selfie-view
-            image = cv2.flip(image, 1)
-            image_rgb = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
+    print("Press 'q' to exit.")
 
-            current_time = time.time()
-            frame_timestamp_ms = int(current_time * 1000)
+    try:
+        with create_face_landmarker(model_data) as landmarker:
+            # imshow/waitKey는 메인 스레드에서 호출해야 하므로 렌더링은 메인 스레드가 담당
+            workers = [
+                threading.Thread(target=capture_worker, args=(cap, frame_queue, stop_event, stats), daemon=True),
+                threading.Thread(target=inference_worker, args=(landmarker, frame_queue, result_queue, stop_event, stats), daemon=True),
+            ]
+            for worker in workers:
+                worker.start()
 
-            # MediaPipe Tasks 형식으로 이미지 변환
-            mp_image = mp.Image(image_format=mp.ImageFormat.SRGB, data=image_rgb)
-            
-            # 얼굴 랜드마크 감지
-            result = landmarker.detect_for_video(mp_image, frame_timestamp_ms)
+            try:
+                while not stop_event.is_set():
+                    try:
+                        item = result_queue.get(timeout=0.1)
+                    except queue.Empty:
+                        if cv2.waitKey(1) & 0xFF == ord('q'):
+                            break
+                        continue
+                    (image, faces, current_time), dropped = drain_to_latest(result_queue, item)
+                    stats["render_drops"] += dropped
 
-            # OpenCV 출력용 BGR로 다시 변환
-            image = cv2.cvtColor(image_rgb, cv2.COLOR_RGB2BGR)
+                    # 모든 감지된 얼굴에 선글라스 적용
+                    if len(faces):
+                        # 얼굴별 선글라스는 모아서 마지막에 한 번에 합성
+                        overlays = []
+                        h, w, _ = image.shape
+                        frame_size = np.array([w, h], dtype=np.float32)
 
-            # 모든 감지된 얼굴에 선글라스 적용
-            if result.face_landmarks:
-                for face_landmarks in result.face_landmarks:
-                    h, w, _ = image.shape
+                        for points in faces:
+                            # 랜드마크 출력 (1초마다)
+                            if current_time - last_print_time > 1.0:
+                                nose_tip = points[2]
+                                print(f"Nose Tip: x={nose_tip[0]:.4f}, y={nose_tip[1]:.4f}, z={nose_tip[2]:.4f}")
+                                last_print_time = current_time
 
-                    # 좌표 변환 함수
-                    def to_px(lm):
-                        return (int(lm.x * w), int(lm.y * h))
-                    
-                    # 눈 위치 추출 (외곽 포인트 사용)
-                    left_eye_outer = to_px(face_landmarks[33])   # 왼쪽 눈 외곽
-                    left_eye_inner = to_px(face_landmarks[133])  # 왼쪽 눈 내곽
-                    right_eye_inner = to_px(face_landmarks[362]) # 오른쪽 눈 내곽
-                    right_eye_outer = to_px(face_landmarks[263]) # 오른쪽 눈 외곽
-                    
-                    # 눈 중심점 계산
-                    left_eye_center = to_px(face_landmarks[468])  # 왼쪽 홍채 중심
-                    right_eye_center = to_px(face_landmarks[473]) # 오른쪽 홍채 중심
+                            # 홍채 중심 좌표를 픽셀 배열로 변환 (행: 왼쪽/오른쪽 눈, 열: x/y)
+                            eye_centers = points[:2, :2] * frame_size
                     
-                    # 두 눈 사이의 거리와 각도 계산
-                    eye_distance = np.sqrt((right_eye_center[0] - left_eye_center[0])**2 + 
-                                          (right_eye_center[1] - left_eye_center[1])**2)
+                            # 두 눈 사이의 거리와 각도 계산
+                            dx, dy = eye_centers[1] - eye_centers[0]
+                            eye_distance = np.hypot(dx, dy)
+                            angle = np.degrees(np.arctan2(dy, dx))
                     
-                    angle = np.degrees(np.arctan2(right_eye_center[1] - left_eye_center[1],
-                                                   right_eye_center[0] - left_eye_center[0]))
+                            # 선글라스 크기 조절 비율 (눈 사이 거리에 맞춤)
+                            # 선글라스 원본의 눈 간격 비율 기준
+                            original_sunglasses_width = sunglasses_alpha.shape[1]
+                            scale = (eye_distance * 2.5) / original_sunglasses_width
                     
-                    # 선글라스 크기 조절 비율 (눈 사이 거리에 맞춤)
-                    # 선글라스 원본의 눈 간격 비율 기준
-                    original_sunglasses_width = sunglasses_img.shape[1]
-                    scale = (eye_distance * 2.5) / original_sunglasses_width
+                            # 선글라스 위치 계산 (두 눈 중심에 배치)
+                            center_x, center_y = eye_centers.mean(axis=0).astype(int).tolist()
                     
-                    # 선글라스 회전 및 크기 조절
-                    transformed_sunglasses = rotate_and_scale_image(sunglasses_img, -angle, scale)
+                            # 화면 밖에 그려질 선글라스는 회전/블렌딩 자체를 생략
+                            sprite_h, sprite_w = sunglasses_alpha.shape
+                            if _target_bbox(center_x, center_y, sprite_w, sprite_h, scale, -angle, w, h) is None:
+                                continue
                     
-                    # 선글라스 위치 계산 (두 눈 중심에 배치)
-                    center_x = (left_eye_center[0] + right_eye_center[0]) // 2
-                    center_y = (left_eye_center[1] + right_eye_center[1]) // 2
+                            # 선글라스 회전 및 크기 조절
+                            transformed_rgb, transformed_alpha = get_transformed_sunglasses(-angle, scale)
                     
-                    # 선글라스 중심을 눈 중심에 맞춤
-                    sunglasses_x = center_x - transformed_sunglasses.shape[1] // 2
-                    sunglasses_y = center_y - transformed_sunglasses.shape[0] // 2
+                            # 선글라스 중심을 눈 중심에 맞춤
+                            sunglasses_x = center_x - transformed_alpha.shape[1] // 2
+                            sunglasses_y = center_y - transformed_alpha.shape[0] // 2
                     
-                    # 선글라스 오버레이
-                    image = overlay_image_alpha(image, transformed_sunglasses, sunglasses_x, sunglasses_y)
+                            overlays.append((transformed_rgb, transformed_alpha, sunglasses_x, sunglasses_y))
 
-                    # 랜드마크 출력 (1초마다)
-                    if current_time - last_print_time > 1.0:
-                        nose_tip = face_landmarks[1]
-                        print(f"Nose Tip: x={nose_tip.x:.4f}, y={nose_tip.y:.4f}, z={nose_tip.z:.4f}")
-                        last_print_time = current_time
+                        # 선글라스 오버레이
+                        image = blend_many(image, overlays)
 
-            # 결과 출력
-            cv2.imshow('MediaPipe FaceMesh Filter', image)
+                    # 결과 출력
+                    cv2.imshow('MediaPipe FaceMesh Filter', image)
 
-            if cv2.waitKey(5) & 0xFF == ord('q'):
-                break
+                    # 버려진 프레임 수 출력 (30프레임마다)
+                    rendered_frames += 1
+                    if rendered_frames % 30 == 0:
+                        print(f"Dropped frames: capture={stats['capture_drops']}, "
+                              f"inference={stats['inference_drops']}, render={stats['render_drops']}, "
+                              f"skipped detections={stats['skipped_detections']}")
 
-    cap.release()
-    cv2.destroyAllWindows()
+                    if cv2.waitKey(5) & 0xFF == ord('q'):
+                        break
+            finally:
+                # 정상 종료/예외/Ctrl+C 모두 워커가 완전히 끝난 뒤에 랜드마커를 해제
+                stop_event.set()
+                for worker in workers:
+                    worker.join()
+    finally:
+        cap.release()
+        cv2.destroyAllWindows()
 
 if __name__ == "__main__":
     main()
@@ -1,5 +1,9 @@
 import os
+import time
+import atexit
 import requests
+from requests.adapters import HTTPAdapter
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 
 # ===============================
@@ -12,9 +16,31 @@ if not API_KEY:
 CURRENT_URL = "https://api.openweathermap.org/data/2.5/weather"
 FORECAST_URL = "https://api.openweathermap.org/data/2.5/forecast"
 
+# ===============================
+# HTTP 세션 (keep-alive로 매 호출마다 TCP/TLS 핸드셰이크 방지)
+# ===============================
+SESSION = requests.Session()
+SESSION.mount("https://", HTTPAdapter(pool_connections=2, pool_maxsize=2))
+SESSION.headers.update({
+    "User-Agent": "pi-weather/1.0",
+    "Connection": "keep-alive",
+})
+
+# ===============================
+# 응답 캐시 (도시별, TTL 초)
+# 현재 날씨는 약 10분 단위로 갱신되므로 짧은 TTL로 중복 호출 방지
+# ===============================
+CURRENT_TTL = 300
+FORECAST_TTL = 900
+CURRENT_CACHE = {}
+FORECAST_CACHE = {}
+
 LOG_DIR = "evidence"
 LOG_FILE = os.path.join(LOG_DIR, "m3_log.txt")
 
+# 로그 파일 핸들 (open_log_file()에서 한 번만 열고 종료 시 닫음)
+_LOG_FH = None
+
 
 # ===============================
 # 유틸 함수
@@ -23,12 +49,34 @@ def ensure_log_dir():
     os.makedirs(LOG_DIR, exist_ok=True)
 
 
-def log(msg: str):
+def open_log_file():
+    global _LOG_FH
+    ensure_log_dir()
+    _LOG_FH = open(LOG_FILE, "a", encoding="utf-8", buffering=8192)
+    atexit.register(_LOG_FH.close)
+
+
+def log(msg: str, flush: bool = False):
     now = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
     line = f"[{now}] {msg}"
     print(line)
-    with open(LOG_FILE, "a", encoding="utf-8") as f:
-        f.write(line + "\n")
+    if _LOG_FH is None:
+        open_log_file()
+    _LOG_FH.write(line + "\n")
+    # 에러 로그는 즉시 디스크에 기록 (나머지는 버퍼링 후 종료 시 기록)
+    if flush:
+        _LOG_FH.flush()
+
+
+def cache_get(cache: dict, city: str, ttl: float):
+    entry = cache.get(city.lower())
+    if entry and time.monotonic() - entry["t"] < ttl:
+        return entry["v"]
+    return None
+
+
+def cache_put(cache: dict, city: str, value):
+    cache[city.lower()] = {"t": time.monotonic(), "v": value}
 
 
 # ===============================
@@ -46,47 +94,60 @@ def log_http_error(context: str, err: requests.HTTPError):
             body_preview = None
 
     if status == 401:
-        log(f"{context}: 401 Unauthorized - API 키가 유효하지 않거나 아직 활성화되지 않았습니다.")
-        log("조치: OpenWeather에서 키 확인/재발급 후, PowerShell 환경변수를 새 키로 다시 설정하세요.")
+        log(f"{context}: 401 Unauthorized - API 키가 유효하지 않거나 아직 활성화되지 않았습니다.", flush=True)
+        log("조치: OpenWeather에서 키 확인/재발급 후, PowerShell 환경변수를 새 키로 다시 설정하세요.", flush=True)
     elif status == 404:
-        log(f"{context}: 404 Not Found - 도시명이 잘못되었을 수 있습니다. (예: Busan, Seoul)")
+        log(f"{context}: 404 Not Found - 도시명이 잘못되었을 수 있습니다. (예: Busan, Seoul)", flush=True)
     elif status is not None:
-        log(f"{context}: HTTP {status} 에러 발생")
+        log(f"{context}: HTTP {status} 에러 발생", flush=True)
         if body_preview:
-            log(f"{context}: 응답 일부: {body_preview}")
+            log(f"{context}: 응답 일부: {body_preview}", flush=True)
     else:
-        log(f"{context}: HTTP 에러 발생 (상태코드 확인 불가)")
+        log(f"{context}: HTTP 에러 발생 (상태코드 확인 불가)", flush=True)
 
 
 # ===============================
 # API 호출 함수
 # ===============================
-def get_current_weather(city: str):
+# 두 함수 모두 (값, 캐시 사용 여부)를 반환
+def get_current_weather(city: str, force: bool = False):
+    if not force:
+        cached = cache_get(CURRENT_CACHE, city, CURRENT_TTL)
+        if cached is not None:
+            return cached, True
+
     params = {
         "q": city,
         "appid": API_KEY,
         "units": "metric",
         "lang": "kr",
     }
-    r = requests.get(CURRENT_URL, params=params, timeout=10)
+    r = SESSION.get(CURRENT_URL, params=params, timeout=10)
     r.raise_for_status()
     data = r.json()
 
-    return {
+    current = {
         "temp": float(data["main"]["temp"]),
         "feels_like": float(data["main"]["feels_like"]),
         "desc": data["weather"][0].get("description", ""),
     }
+    cache_put(CURRENT_CACHE, city, current)
+    return current, False
 
 
-def get_rain_probability(city: str):
+def get_rain_probability(city: str, force: bool = False):
+    if not force:
+        cached = cache_get(FORECAST_CACHE, city, FORECAST_TTL)
+        if cached is not None:
+            return cached, True
+
     params = {
         "q": city,
         "appid": API_KEY,
         "units": "metric",
         "lang": "kr",
     }
-    r = requests.get(FORECAST_URL, params=params, timeout=10)
+    r = SESSION.get(FORECAST_URL, params=params, timeout=10)
     r.raise_for_status()
     data = r.json()
 
@@ -96,23 +157,55 @@ def get_rain_probability(city: str):
     pop_percent = int(round(pop * 100))
     pop_time = item.get("dt_txt", "")
 
-    return pop_percent, pop_time
+    cache_put(FORECAST_CACHE, city, (pop_percent, pop_time))
+    return (pop_percent, pop_time), False
+
+
+def fetch_result(future, context: str):
+    """병렬 호출 결과 수집: 실패해도 다른 호출 결과는 보여줄 수 있도록 None 반환"""
+    try:
+        return future.result()
+
+    except requests.HTTPError as e:
+        log_http_error(context, e)
+
+    except requests.Timeout:
+        log(f"{context}: Timeout - 네트워크 상태를 확인하고 다시 시도하세요.", flush=True)
+
+    except requests.RequestException as e:
+        # URL/키가 포함될 수 있는 메시지는 최소화
+        log(f"{context}: RequestException - {type(e).__name__}", flush=True)
+
+    except Exception as e:
+        log(f"{context}: 예상치 못한 에러: {type(e).__name__}", flush=True)
+
+    return None
 
 
 # ===============================
 # 출력 함수
 # ===============================
-def print_weather(city: str, current: dict, pop: int, pop_time: str):
+def cache_tag(cached: bool) -> str:
+    return " (캐시)" if cached else ""
+
+
+def print_weather(city: str, current, pop, pop_time: str, current_cached: bool = False, forecast_cached: bool = False):
     print("\n==============================")
     print(f"📍 도시: {city}")
-    if current.get("desc"):
-        print(f"🌥 현재 상태: {current['desc']}")
-    print(f"🌡 현재 온도: {current['temp']:.1f}°C")
-    print(f"🤒 체감온도: {current['feels_like']:.1f}°C")
-    if pop_time:
-        print(f"☔ 강수확률: {pop}% (기준: {pop_time})")
+    if current is None:
+        print("🌡 현재 날씨: 조회 실패")
     else:
-        print(f"☔ 강수확률: {pop}%")
+        tag = cache_tag(current_cached)
+        if current.get("desc"):
+            print(f"🌥 현재 상태: {current['desc']}{tag}")
+        print(f"🌡 현재 온도: {current['temp']:.1f}°C{tag}")
+        print(f"🤒 체감온도: {current['feels_like']:.1f}°C{tag}")
+    if pop is None:
+        print("☔ 강수확률: 조회 실패")
+    elif pop_time:
+        print(f"☔ 강수확률: {pop}% (기준: {pop_time}){cache_tag(forecast_cached)}")
+    else:
+        print(f"☔ 강수확률: {pop}%{cache_tag(forecast_cached)}")
     print("==============================\n")
 
 
@@ -120,40 +213,50 @@ def print_weather(city: str, current: dict, pop: int, pop_time: str):
 # 메인
 # ===============================
 def main():
-    ensure_log_dir()
+    open_log_file()
 
     city = "Seoul"
     log("M3 Weather 프로그램 시작")
     log(f"초기 도시 설정: {city}")
+    force_refresh = False
 
     while True:
-        try:
+        # 현재 날씨/예보는 서로 독립이므로 동시에 요청 (총 지연 = 두 호출 중 긴 쪽)
+        with ThreadPoolExecutor(max_workers=2) as ex:
             # 온도/체감온도: Current API
-            current = get_current_weather(city)
+            current_future = ex.submit(get_current_weather, city, force_refresh)
 
             # 강수확률: Forecast API
-            pop, pop_time = get_rain_probability(city)
+            forecast_future = ex.submit(get_rain_probability, city, force_refresh)
 
-            print_weather(city, current, pop, pop_time)
-            # ✅ 따옴표/줄바꿈 문제 방지: f-string 한 줄로만 기록
-            log(f"날씨 갱신 | {city} | temp={current['temp']:.1f}C, feels={current['feels_like']:.1f}C, pop={pop}%")
+            current_result = fetch_result(current_future, "현재 날씨 API 호출")
+            forecast_result = fetch_result(forecast_future, "예보 API 호출")
 
-        except requests.HTTPError as e:
-            log_http_error("API 호출", e)
+        current, current_cached = current_result if current_result is not None else (None, False)
+        forecast, forecast_cached = forecast_result if forecast_result is not None else (None, False)
+        pop, pop_time = forecast if forecast is not None else (None, "")
 
-        except requests.Timeout:
-            log("API 호출: Timeout - 네트워크 상태를 확인하고 다시 시도하세요.")
+        if current is not None or forecast is not None:
+            print_weather(city, current, pop, pop_time, current_cached, forecast_cached)
 
-        except requests.RequestException as e:
-            # URL/키가 포함될 수 있는 메시지는 최소화
-            log(f"API 호출: RequestException - {type(e).__name__}")
+        # 캐시에서 가져온 값은 로그에도 (캐시)로 표시하여 실제 네트워크 갱신과 구분
+        if current is not None and forecast is not None:
+            # ✅ 따옴표/줄바꿈 문제 방지: f-string 한 줄로만 기록
+            log(f"날씨 갱신 | {city} | temp={current['temp']:.1f}C, feels={current['feels_like']:.1f}C{cache_tag(current_cached)}, pop={pop}%{cache_tag(forecast_cached)}")
+        elif current is not None:
+            log(f"날씨 일부 갱신 | {city} | temp={current['temp']:.1f}C, feels={current['feels_like']:.1f}C{cache_tag(current_cached)}, pop=조회 실패")
+        elif forecast is not None:
+            log(f"날씨 일부 갱신 | {city} | 현재 날씨 조회 실패, pop={pop}%{cache_tag(forecast_cached)}")
 
-        except Exception as e:
-            log(f"예상치 못한 에러: {type(e).__name__}")
+        force_refresh = False
+        raw_cmd = input("입력: [c]도시변경 / [r]새로고침 / [R]강제 새로고침 / [q]종료 > ").strip()
+        cmd = raw_cmd.lower()
 
-        cmd = input("입력: [c]도시변경 / [r]새로고침 / [q]종료 > ").strip().lower()
+        if raw_cmd == "R":
+            log("사용자 요청: 강제 새로고침 (캐시 무시)")
+            force_refresh = True
 
-        if cmd == "c":
+        elif cmd == "c":
             new_city = input("도시 이름 입력 (예: Busan, Tokyo) > ").strip()
             if new_city:
                 log(f"도시 변경: {city} → {new_city}")
@@ -169,7 +272,7 @@ def main():
             break
 
         else:
-            log(f"알 수 없는 입력: {cmd} (c/r/q 중 하나)")
+            log(f"알 수 없는 입력: {cmd} (c/r/R/q 중 하나)")
 
 
 if __name__ == "__main__":